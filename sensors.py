@@ -13,7 +13,6 @@ last edited: Sept. 1, 2017
 import sys
 import os
 import time
-import random
 import json
 
 import matplotlib
@@ -21,9 +20,14 @@ matplotlib.use('Qt5Agg') # Make sure that we are using QT5
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
-from numpy import sin, pi
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError: # numba is optional, _eval_ph then runs as plain Python
+    def njit(*args, **kwargs):
+        return lambda func: func
+
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QMenu, QGridLayout,
      QSizePolicy, QMessageBox, QWidget, QPushButton, QAction, QHBoxLayout,
      QVBoxLayout, QLCDNumber, QSlider, QLabel, QComboBox)
@@ -33,93 +37,195 @@ from PyQt5.QtCore import (QCoreApplication, Qt, QTimer)
 # === custom module ===
 import serial_comm as comm
 
+# number of the latest samples shown in the pH and temperature plots
+WINDOW = 10
+
+# one row of the data log per sample, in the columns of its header
+LOG_FMT = "%.4f\t%.4f\t%.4f\t%.4f\t%.4f\t%.4f\n"
+
+# === define functions ===
+# pH value from the mean potential (mV) and temperature (℃) of the latest samples,
+# with E_offset (mV), k2*T in acid and in alkaline (mV/pH) calibrated at t (Kelvin)
+# a zero k2*T (e.g. pH 7 and pH 4 calibrated at the same potential) gives ±inf,
+# which evalPH clamps to 0 or 14, both compiled (error_model) and in plain Python
+@njit('f8(f8,f8,f8,f8,f8,f8)', cache=True, error_model='numpy')
+def _eval_ph(mean_v, mean_t_c, e_offset, k2a, k2b, t):
+    t_mean = np.float64(mean_t_c + 273.15) # current temperature, in Kelvin
+    delta_mv = mean_v - e_offset/t*t_mean
+    if delta_mv >= 0: # acid
+        return 7 - delta_mv/(k2a/t*t_mean)
+    else: # alkaline
+        return 7 - delta_mv/(k2b/t*t_mean)
+
 # === define classes ===
-# basic canvas for matplotlib figure
-class MyMplCanvas(FigureCanvas):
-    """Ultimately, this is a QWidget (as well as a FigureCanvasAgg, etc.)."""
+# basic plot on a set of axes of the figure
+class MyPlot(object):
+    """Draws into axes of a CombinedCanvas."""
 
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        fig.subplots_adjust(bottom=0.15) # set the botoom space to show the x-axis label
-        self.axes = fig.add_subplot(111)
+    # set by the subclasses
+    color = None
+    title = None
+    ylabel = None
 
+    def __init__(self, axes):
+        self.axes = axes
         self.compute_initial_figure()
 
-        FigureCanvas.__init__(self, fig)
-        self.setParent(parent)
-
-        FigureCanvas.setSizePolicy(self,
-                                   QSizePolicy.Expanding,
-                                   QSizePolicy.Expanding)
-        FigureCanvas.updateGeometry(self)
-
     def compute_initial_figure(self):
-        pass
-
-# static figure
-class MyStaticMplCanvas(MyMplCanvas):
-    """Simple canvas with a sine plot."""
+        self.x = np.arange(WINDOW)
+        self.y = np.zeros(WINDOW)
+        self.li, = self.axes.plot(self.x, self.y, self.color, animated=True)
+        self.axes.set_title(self.title, fontweight='bold')
+        self.axes.set_xlabel("Time, s")
+        self.axes.set_ylabel(self.ylabel)
+
+    def update_ylim(self, y_min, y_max):
+        """Fits the y axis to [y_min-1, y_max+1], unless the fitted limits
+        are within 0.5 of the current ones, both when the data widens and
+        when it narrows. CombinedCanvas redraws the axes whenever any x or
+        y limits change, and only blits the lines otherwise, so the limits
+        must stay put on most samples.
+        """
+        lo, hi = self.axes.get_ylim()
+        if abs(y_min-1 - lo) > 0.5 or abs(y_max+1 - hi) > 0.5:
+            self.axes.set_ylim(y_min-1, y_max+1)
+
+# plot of the latest samples
+class WindowPlot(MyPlot):
+    """A plot of the latest WINDOW samples."""
 
     def compute_initial_figure(self):
-        t = np.arange(0.0, 3.0, 0.01)
-        s = sin(2*pi*t)
-        self.axes.plot(t, s)
-
-# dynamic figure
-class MyDynamicMplCanvas(MyMplCanvas):
-    """A canvas that updates itself every second with a new plot."""
+        MyPlot.compute_initial_figure(self)
+        self._sum = 0.0 # running sum of self.y
 
-    def __init__(self, *args, **kwargs):
-        MyMplCanvas.__init__(self, *args, **kwargs)
-        timer = QTimer(self)
-        timer.timeout.connect(self.update_figure)
-        timer.start(1000)
+    @property
+    def mean(self):
+        """Mean of the samples in the window."""
+        return self._sum / WINDOW
 
-    def compute_initial_figure(self):
-        self.axes.plot([0, 1, 2, 3], [1, 2, 0, 4], 'r')
+    def add_sample(self, value):
+        self._sum += value - self.y[0]
+        # shift the window left by one sample in place, no reallocation
+        self.y[:-1] = self.y[1:]
+        self.y[-1] = value
 
     def update_figure(self):
-        # Build a list of 4 random integers between 0 and 10 (both inclusive)
-        l = [random.randint(0, 10) for i in range(4)]
-        self.axes.cla()
-        self.axes.plot([0, 1, 2, 3], l, 'r')
-        self.draw()
+        self.li.set_ydata(self.y)
+        self.update_ylim(self.y.min(), self.y.max())
 
 # dynamic figure for pH plot
-class PHMplCanvas(MyMplCanvas):
-    """A canvas that updates itself every second with a new plot."""
+class PHPlot(WindowPlot):
+    """A plot of the latest pH electrode potentials."""
+
+    color = 'r'
+    title = "Potentiometric pH sensor"
+    ylabel = "Potential, mV"
 
-    def __init__(self, *args, **kwargs):
-        MyMplCanvas.__init__(self, *args, **kwargs)
+# dynamic figure for the full temporal pH plot
+class PHFullPlot(MyPlot):
+    """A plot that keeps every pH electrode potential since the start of the plot."""
+
+    color = PHPlot.color
+    title = PHPlot.title
+    ylabel = PHPlot.ylabel
 
     def compute_initial_figure(self):
-        self.x = np.arange(10)
-        self.y = np.zeros(10)
-        self.li, = self.axes.plot(self.x, self.y, 'r')
-        self.axes.set_title("Potentiometric pH sensor", fontweight='bold')
-        self.axes.set_xlabel("Time, s")
-        self.axes.set_ylabel("Potential, mV")
+        MyPlot.compute_initial_figure(self)
+        # self.n samples are in use, the buffers hold self._cap samples
+        self.n = WINDOW
+        self._cap = WINDOW
+        # nothing is ever removed, so the extremes are tracked per sample
+        self.y_min = self.y_max = 0.0
+
+    def add_sample(self, value):
+        # double the capacity when full, so the copies are amortized
+        if self.n == self._cap:
+            self._cap *= 2
+            # the time axis is just the sample index, so it is not copied
+            self.x = np.arange(self._cap)
+            y = np.empty(self._cap)
+            y[:self.n] = self.y
+            self.y = y
+        self.y[self.n] = value
+        self.y_min = min(self.y_min, value)
+        self.y_max = max(self.y_max, value)
+        self.n += 1
 
     def update_figure(self):
-        pass
+        x = self.x[:self.n]
+        y = self.y[:self.n]
+        self.li.set_data(x, y)
+        self.update_ylim(self.y_min, self.y_max)
+        # the x axis is extended by 10% when the data reaches its end, so it
+        # changes (and the axes are redrawn) only every 10% of new samples
+        if self.n-1 > self.axes.get_xlim()[1]:
+            self.axes.set_xlim(0, int((self.n-1)*1.1))
 
 # dynamic figure for temperature plot
-class TempMplCanvas(MyMplCanvas):
-    """A canvas that updates itself every second with a new plot."""
+class TempPlot(WindowPlot):
+    """A plot of the latest temperatures."""
 
-    def __init__(self, *args, **kwargs):
-        MyMplCanvas.__init__(self, *args, **kwargs)
+    color = 'b'
+    title = "Environment Temperature"
+    ylabel = "Temperature, ℃"
 
-    def compute_initial_figure(self):
-        self.x = np.arange(10)
-        self.y = np.zeros(10)
-        self.li, = self.axes.plot(self.x, self.y, 'b')
-        self.axes.set_title("Environment Temperature", fontweight='bold')
-        self.axes.set_xlabel("Time, s")
-        self.axes.set_ylabel("Temperature, ℃")
+# canvas for all the matplotlib figures
+class CombinedCanvas(FigureCanvas):
+    """Ultimately, this is a QWidget (as well as a FigureCanvasAgg, etc.).
+
+    A single figure holds the full pH plot on the top row, and the latest
+    pH and temperature plots side by side on the bottom row, so a repaint
+    is one Agg composite and one Qt paint event.
+    """
+
+    def __init__(self, parent=None, width=14, height=6, dpi=100):
+        fig = Figure(figsize=(width, height), dpi=dpi)
+        # leave space to show the titles and x-axis labels
+        grid = fig.add_gridspec(2, 2, hspace=0.5, bottom=0.08)
+        self.ph_full_plot = PHFullPlot(fig.add_subplot(grid[0, :]))
+        self.ph_plot = PHPlot(fig.add_subplot(grid[1, 0]))
+        self.temp_plot = TempPlot(fig.add_subplot(grid[1, 1]))
+        self.plots = (self.ph_full_plot, self.ph_plot, self.temp_plot)
+
+        self.background = None # figure without the animated lines, for blitting
+
+        FigureCanvas.__init__(self, fig)
+        self.setParent(parent)
+
+        FigureCanvas.setSizePolicy(self,
+                                   QSizePolicy.Expanding,
+                                   QSizePolicy.Expanding)
+        FigureCanvas.updateGeometry(self)
+
+        # a full draw (first show, resize, new limits) refreshes the background
+        self.mpl_connect('draw_event', self.on_draw)
+
+    def axes_lims(self):
+        return [(plot.axes.get_xlim(), plot.axes.get_ylim()) for plot in self.plots]
+
+    def draw_lines(self):
+        for plot in self.plots:
+            plot.axes.draw_artist(plot.li)
+
+    def on_draw(self, event):
+        """Cache the background and paint the animated lines over it."""
+        self.background = self.copy_from_bbox(self.figure.bbox)
+        self.background_lims = self.axes_lims()
+        self.draw_lines()
 
     def update_figure(self):
-        pass
+        """Repaint the plots, only their lines over the cached background
+        when no axes limits changed.
+        """
+        for plot in self.plots:
+            plot.update_figure()
+        # axes limits changed, so ticks and labels have to be redrawn as well
+        if self.background is None or self.background_lims != self.axes_lims():
+            self.draw()
+            return
+        self.restore_region(self.background)
+        self.draw_lines()
+        self.blit(self.figure.bbox)
 
 # main window
 class ApplicationWindow(QMainWindow):
@@ -155,26 +261,20 @@ class ApplicationWindow(QMainWindow):
         # QVBoxLayout() lines up widgets vertically
         # QHBoxLayout() lines up widgets horizontally
         # QGridLayout() lays out widgets in a grid
-        # vbox includes hbox1, hbox2, grid, hbox3, and hbox4 from top to bottom
+        # vbox includes hbox1, grid, hbox3, and hbox4 from top to bottom
         vbox = QVBoxLayout(self.main_widget)
 
-        #sc = MyStaticMplCanvas(self.main_widget, width=5, height=4, dpi=100)
-        #dc = MyDynamicMplCanvas(self.main_widget, width=5, height=4, dpi=100)
-        self.ph_full_plot = PHMplCanvas(self.main_widget, width=14, height=3, dpi=100)
-        self.ph_plot = PHMplCanvas(self.main_widget, width=7, height=3, dpi=100)
-        self.temp_plot = TempMplCanvas(self.main_widget, width=7, height=3, dpi=100)
+        self.canvas = CombinedCanvas(self.main_widget, width=14, height=6, dpi=100)
+        self.ph_full_plot = self.canvas.ph_full_plot
+        self.ph_plot = self.canvas.ph_plot
+        self.temp_plot = self.canvas.temp_plot
 
-        # hbox1 is the full temporal plot of pH value
+        # hbox1 includes the full temporal plot of pH value, and
+        # the latest 10 s plot of pH and temperature, respectively
         hbox1 = QHBoxLayout()
-        hbox1.addWidget(self.ph_full_plot)
+        hbox1.addWidget(self.canvas)
         # hbox1.addStretch(1)
 
-        # hbox2 includes the latest 10 s plot of pH and temperature, respectively
-        hbox2 = QHBoxLayout()
-        hbox2.addWidget(self.ph_plot)
-        hbox2.addWidget(self.temp_plot)
-        # hbox2.addStretch(1)
-
         ph_label = QLabel('pH Value: ')
         temp_label = QLabel('Temperature, ℃: ')
 
@@ -240,17 +340,14 @@ class ApplicationWindow(QMainWindow):
 
         # === read pH calibration value ===
         self.readJson()
+        self._cal_dirty = False # saved to the .json file on quit if True
 
         # === show previous calibration information ===
         self.cal_label1 = QLabel('Calibration: E = k1*T - k2*T*(pH - pH7)')
-        self.cal_label2 = QLabel('E_offset (k1*T): ' +
-            str(round(self.ph_cal_dict['ph7_cal'], 1)) + ", mV")
-        self.cal_label3 = QLabel('k2*T @ acid: ' +
-            str(round((self.ph_cal_dict['ph4_cal']-self.ph_cal_dict['ph7_cal'])/3.0, 1)) +
-            ", mV/pH")
-        self.cal_label4 = QLabel('k2*T @ alkaline: ' +
-            str(round((self.ph_cal_dict['ph7_cal']-self.ph_cal_dict['ph10_cal'])/3.0, 1)) +
-            ", mV/pH")
+        self.cal_label2 = QLabel()
+        self.cal_label3 = QLabel()
+        self.cal_label4 = QLabel()
+        self.refreshCalLabels()
         ph7_cal_button = QPushButton("pH 7 calibration")
         ph7_cal_button.clicked.connect(self.ph7CalButton)
         ph4_cal_button = QPushButton("pH 4 calibration")
@@ -268,10 +365,7 @@ class ApplicationWindow(QMainWindow):
         hbox4.addWidget(ph10_cal_button)
         hbox4.addWidget(self.cal_label4)
 
-        # vbox.addWidget(sc)
-        # vbox.addWidget(dc)
         vbox.addLayout(hbox1)
-        vbox.addLayout(hbox2)
         vbox.addLayout(grid)
         vbox.addLayout(hbox3)
         vbox.addLayout(hbox4)
@@ -285,9 +379,20 @@ class ApplicationWindow(QMainWindow):
         for i in self.serial_devices.ports:
             self.serial_combobox.addItem(i)
 
+        # values shown on the LCDs
+        self._last_temp = None
+        self._last_ph = None
+
         # === dynamic update ===
-        self.timer1 = QTimer(self)
-        self.timer1.timeout.connect(self.updateFigs)
+        self.reader = None # reads the serial port once connected
+        self.log_file = None # data log of the current connection
+        self.timer3 = QTimer(self)
+        self.timer3.timeout.connect(self.flushLog)
+        # the plots are repainted by timer2 at most every 100 ms, however
+        # often samples arrive; this still runs on the GUI thread
+        self._plots_dirty = False
+        self.timer2 = QTimer(self)
+        self.timer2.timeout.connect(self.updatePlots)
 
         # === make a data dir if run at the first time ===
         self.dataDir = os.path.join(os.getcwd(),"data")
@@ -313,33 +418,43 @@ class ApplicationWindow(QMainWindow):
                 json.dump(self.ph_cal_dict, f_obj, indent=4)
 
 
+    # update the calibration constants used by evalPH and show them,
+    # only needed when they change
+    def refreshCalLabels(self):
+        self._e_offset = self.ph_cal_dict['ph7_cal']
+        self._k2a = (self.ph_cal_dict['ph4_cal'] - self.ph_cal_dict['ph7_cal'])/3
+        self._k2b = (self.ph_cal_dict['ph7_cal'] - self.ph_cal_dict['ph10_cal'])/3
+        self._cal_t = self.ph_cal_dict['T']
+        self.cal_label2.setText(f"E_offset (k1*T): {self._e_offset:.1f}, mV")
+        self.cal_label3.setText(f"k2*T @ acid: {self._k2a:.1f}, mV/pH")
+        self.cal_label4.setText(f"k2*T @ alkaline: {self._k2b:.1f}, mV/pH")
+
     def ph7CalButton(self):
         # save the current voltage as the calibrated value of pH 7
-        self.ph_cal_dict['ph7_cal'] = round(np.mean(self.ph_plot.y),2)
+        self.ph_cal_dict['ph7_cal'] = round(self.ph_plot.mean,2)
         # save the current temperature for calibration, in Kelvin
-        self.ph_cal_dict['T'] = round(np.mean(self.temp_plot.y),2) + 273.15
+        self.ph_cal_dict['T'] = round(self.temp_plot.mean,2) + 273.15
+        self._cal_dirty = True
+        self.refreshCalLabels()
 
 
     def ph4CalButton(self):
         # save the current voltage as the calibrated value of pH 4
-        self.ph_cal_dict['ph4_cal'] = round(np.mean(self.ph_plot.y),2)
+        self.ph_cal_dict['ph4_cal'] = round(self.ph_plot.mean,2)
+        self._cal_dirty = True
+        self.refreshCalLabels()
 
 
     def ph10CalButton(self):
         # save the current voltage as the calibrated value of pH 10
-        self.ph_cal_dict['ph10_cal'] = round(np.mean(self.ph_plot.y),2)
+        self.ph_cal_dict['ph10_cal'] = round(self.ph_plot.mean,2)
+        self._cal_dirty = True
+        self.refreshCalLabels()
 
     # evaluate the current pH value
     def evalPH(self):
-        ph7_cal = self.ph_cal_dict['ph7_cal']
-        ph4_cal = self.ph_cal_dict['ph4_cal']
-        ph10_cal = self.ph_cal_dict['ph10_cal']
-        t = self.ph_cal_dict['T']
-        delta_mv = np.mean(self.ph_plot.y) - ph7_cal/t*(np.mean(self.temp_plot.y)+273.15)
-        if delta_mv >= 0: # acid
-            pH = 7 - delta_mv/((ph4_cal - ph7_cal)/3/t*(np.mean(self.temp_plot.y)+273.15))
-        else: # alkaline
-            pH = 7 - delta_mv/((ph7_cal - ph10_cal)/3/t*(np.mean(self.temp_plot.y)+273.15))
+        pH = _eval_ph(self.ph_plot.mean, self.temp_plot.mean,
+            self._e_offset, self._k2a, self._k2b, self._cal_t)
         pH = round(pH, 2)
         if pH <= 0:
             return 0
@@ -348,62 +463,70 @@ class ApplicationWindow(QMainWindow):
         else:
             return pH
 
-    # update the figures and diaplays
-    def updateFigs(self):
-        line = self.ser.readline() # read data from serial port, one line at a time
-        self.data = [float(val) for val in line.split()] # split data to float numbers
+    # update the figures and diaplays with a line of data from the serial port
+    def updateFigs(self, data):
+        # lines already queued by the reader may arrive after disconnecting
+        if self.log_file is None:
+            return
+        self.data = data
         # the data read from the serial port should be 4 float numbers, otherwise neglect it.
         # the 4 float numbers are temperaure, humidity, voltage at reference electrode,
         # and voltage at pH electrode, respectively.
-        if(len(self.data) == 4):
-            self.temp_lcd.display(self.data[0])
-            self.temp_plot.y = np.append(self.temp_plot.y, float(self.data[0]))
-            self.temp_plot.y = np.delete(self.temp_plot.y, 0)
-            self.temp_plot.li.set_ydata(self.temp_plot.y)
-            self.temp_plot.axes.set_ylim(min(self.temp_plot.y)-1, max(self.temp_plot.y)+1)
-            self.temp_plot.draw()
-
+        if(self.data.size == 4):
+            temp, humi, v_re, v_ph = self.data.tolist() # as Python floats
             # the galvanic voltage of a pH probe is the voltage difference between the
-            # pH electrode (self.data[3]) and reference electrode (self.data[2]).
+            # pH electrode (v_ph) and reference electrode (v_re).
+            v_diff = v_ph - v_re
+
+            # QLCDNumber repaints on every display(), so skip unchanged values
+            if temp != self._last_temp:
+                self.temp_lcd.display(temp)
+                self._last_temp = temp
+            self.temp_plot.add_sample(temp)
+
             self.data_pH = self.evalPH()
-            self.ph_lcd.display(self.data_pH)
-            self.ph_plot.y = np.append(self.ph_plot.y, float(self.data[3]-self.data[2]))
-            self.ph_plot.y = np.delete(self.ph_plot.y, 0)
-            self.ph_plot.li.set_ydata(self.ph_plot.y)
-            self.ph_plot.axes.set_ylim(min(self.ph_plot.y)-1, max(self.ph_plot.y)+1)
-            self.ph_plot.draw()
-
-            self.ph_full_plot.y = np.append(self.ph_full_plot.y, float(self.data[3]-self.data[2]))
-            self.ph_full_plot.x = np.append(self.ph_full_plot.x, self.ph_full_plot.x[-1] + 1)
-            self.ph_full_plot.li.set_ydata(self.ph_full_plot.y)
-            self.ph_full_plot.li.set_xdata(self.ph_full_plot.x)
-            self.ph_full_plot.axes.set_ylim(min(self.ph_full_plot.y)-1, max(self.ph_full_plot.y)+1)
-            self.ph_full_plot.axes.set_xlim(min(self.ph_full_plot.x), max(self.ph_full_plot.x))
-            self.ph_full_plot.draw()
-
-            self.cal_label2.setText('E_offset (k1*T): ' +
-                str(round(self.ph_cal_dict['ph7_cal'], 1)) + ", mV")
-            self.cal_label3.setText('k2*T @ acid: ' +
-                str(round((self.ph_cal_dict['ph4_cal'] - self.ph_cal_dict['ph7_cal'])/3, 1)) +
-                ", mV/pH")
-            self.cal_label4.setText('k2*T @ alkaline: ' +
-                str(round((self.ph_cal_dict['ph7_cal'] - self.ph_cal_dict['ph10_cal'])/3, 1)) +
-                ", mV/pH")
-
-            # save measured data to file
-            with open(self.filename, 'a') as file_object:
-                file_object.write(str(self.data[0]) + "    " +
-                    str(self.data[1]) + "    " +
-                    str(self.data[2]) + "    " +
-                    str(self.data[3]) + "    " +
-                    str(self.data[3] - self.data[2]) + "    " +
-                    str(self.data_pH) + "\n")
+            if self.data_pH != self._last_ph:
+                self.ph_lcd.display(self.data_pH)
+                self._last_ph = self.data_pH
+            self.ph_plot.add_sample(v_diff)
+            self.ph_full_plot.add_sample(v_diff)
+
+            # the next updatePlots shows this sample, together with any
+            # others that arrived since the last repaint
+            self._plots_dirty = True
 
+            # save measured data to file, flushed by timer3
+            self.log_file.write(LOG_FMT % (temp, humi, v_re, v_ph, v_diff, self.data_pH))
+
+
+    # repaint the figures if new samples arrived, at the pace of timer2
+    # rather than once per sample in updateFigs
+    def updatePlots(self):
+        if not self._plots_dirty:
+            return
+        self._plots_dirty = False
+        self.canvas.update_figure()
+
+    def flushLog(self):
+        self.log_file.flush()
+
+    def closeLog(self):
+        self.timer3.stop()
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
 
     def fileQuit(self):
-        # save the calibration data to .json file
-        with open(self.json_file, 'w') as f_obj:
-            json.dump(self.ph_cal_dict, f_obj, indent=4)
+        # the reader thread must not outlive the window
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+        self.closeLog()
+        # save the calibration data to .json file, if calibrated
+        if self._cal_dirty:
+            with open(self.json_file, 'w') as f_obj:
+                json.dump(self.ph_cal_dict, f_obj, indent=4)
+            self._cal_dirty = False
         self.close()
 
     def closeEvent(self, ce):
@@ -442,29 +565,45 @@ Date: 2017.05.25
     # Bluetooth is a serial port as well as the USB port
     def connectButton(self):
         """connect to serial port"""
-        self.ser = comm.serial.Serial(self.serial_combobox.currentText(), baudrate=9600, timeout=1)
+        # close the current connection first, its reader thread and data log
+        if self.reader is not None:
+            self.disconnectButton()
+        self.ser = comm.serial.Serial(self.serial_combobox.currentText(), baudrate=9600, timeout=1,
+            inter_byte_timeout=0.01)
+        comm.set_low_latency(self.ser)
         print(self.ser.name)
-        self.timer1.start(1000)
+        # the serial port is read in a background thread, one line at a time
+        self.reader = comm.SerialReader(self.ser, self)
+        self.reader.sample.connect(self.updateFigs)
+        self.reader.start()
+        self.timer2.start(100)
         self.statusBar().showMessage("Connected.   " + self.ser.name)
         self.time_stamp = time.strftime("%Y%m%d_%H_%M_%S",time.localtime(time.time()))
         # create a file to store the measured data
         self.filename = "data_" + self.time_stamp + ".txt"
         self.filename = os.path.join(self.dataDir, self.filename)
-        with open(self.filename, 'w') as file_object:
-            file_object.write("# wireless pH sensor data log\n")
-            file_object.write("# Date: " + self.time_stamp + "\n")
-            file_object.write("# Temperature (℃), Relative Humidity (%)," +
-                " Voltage of Ag/AgCl electrode (mV)," +
-                " Voltage of pH electrode (mV)," +
-                " Voltage difference (mV)," +
-                " Evaluated pH Value\n")
-            file_object.write("# \n")
+        # the file stays open until disconnected, writes are buffered
+        self.log_file = open(self.filename, 'w', buffering=1<<16)
+        self.log_file.write("# wireless pH sensor data log\n")
+        self.log_file.write("# Date: " + self.time_stamp + "\n")
+        self.log_file.write("# Temperature (℃), Relative Humidity (%)," +
+            " Voltage of Ag/AgCl electrode (mV)," +
+            " Voltage of pH electrode (mV)," +
+            " Voltage difference (mV)," +
+            " Evaluated pH Value\n")
+        self.log_file.write("# \n")
+        self.timer3.start(5000)
 
     def disconnectButton(self):
         """disconnect to serial port"""
+        if self.reader is None: # not connected
+            return
+        self.reader.stop()
+        self.reader = None
         self.ser.flush()
         self.ser.close()
-        self.timer1.stop()
+        self.timer2.stop()
+        self.closeLog()
         self.statusBar().showMessage("Disconnected.")
 
 
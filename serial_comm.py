@@ -1,27 +1,86 @@
 # === custom module for serial ports communication ===
+import time
+
+import numpy as np
 import serial
 from serial.tools import list_ports
+from PyQt5.QtCore import (QThread, pyqtSignal)
 
 
 class SerialDevices(object):
     """Retrieves and stores list of serial devices in self.ports"""
     def __init__(self):
-        try:
-            self.ports, _, _ = zip(*list_ports.comports())
-        except ValueError:
-            self.ports = []
+        self.refresh(force=True)
+        if not self.ports:
             print("No serial ports found")
 
-    def refresh(self):
-        """Refreshes list of ports."""
-        self.ports, _, _ = zip(*list_ports.comports())
+    def refresh(self, force=False):
+        """Refreshes list of ports, unless scanned within the last second."""
+        now = time.monotonic()
+        if not force and now - self._last_scan < 1:
+            return
+        self.ports = [p.device for p in list_ports.comports()]
+        self._last_scan = now
 
 class delayedSerial(serial.Serial):
-    """Extends Serial.write so that characters are output individually
-    with a slight delay
+    """Extends Serial.write so that characters are output in small blocks
+    with a slight delay in between
     """
     def write(self, data):
-        for i in data:
-            serial.Serial.write(self, i)
-            # the unit is sec, so this statement delay 1 ms after writing every char
+        for i in range(0, len(data), 8):
+            serial.Serial.write(self, data[i:i+8])
+            # the unit is sec, so this statement delay 1 ms after writing every 8 chars
             time.sleep(.001)
+        self.flush()
+        return len(data)
+
+
+def set_low_latency(ser):
+    """Asks the driver to deliver received bytes at once instead of
+    buffering them (e.g. up to 16 ms for FTDI adapters on Linux).
+    Only supported on Linux, and not by every tty: pyserial raises
+    ValueError for ttys without TIOCGSERIAL (e.g. Bluetooth rfcomm),
+    NotImplementedError on macOS/BSD, and has no such method on Windows.
+    """
+    try:
+        ser.set_low_latency_mode(True)
+    except (AttributeError, ValueError, NotImplementedError, OSError):
+        pass
+
+
+class SerialReader(QThread):
+    """Reads lines from a serial port in the background and emits each
+    line as an array of float numbers, as fast as the device sends them
+    """
+    sample = pyqtSignal(object)
+
+    def __init__(self, ser, parent=None):
+        QThread.__init__(self, parent)
+        self.ser = ser
+        self._run = True
+
+    def run(self):
+        buf = b''
+        while self._run:
+            # wait for one byte (b'' if timed out), then take everything
+            # already waiting in one call instead of one read per byte
+            data = self.ser.read(1)
+            if not data:
+                continue
+            buf += data + self.ser.read(self.ser.in_waiting)
+            # the last item is an incomplete line, kept for the next read
+            *lines, buf = buf.split(b'\n')
+            for line in lines:
+                # a line that is not all numbers, such as "Read DHT11 failed",
+                # gives an empty or short array (with a DeprecationWarning) on
+                # NumPy 1.x, rejected by the size check in updateFigs, and
+                # raises ValueError on NumPy 2.x
+                try:
+                    self.sample.emit(np.fromstring(line, sep=' '))
+                except ValueError:
+                    pass
+
+    def stop(self):
+        """Stops reading and waits for the thread to finish."""
+        self._run = False
+        self.wait()